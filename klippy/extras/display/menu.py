@@ -375,9 +375,10 @@ class MenuContainer(MenuElement):
             self._parents.append(parents)
 
     def assert_recursive_relation(self, parents=None):
-        assert self not in (parents or self._parents), (
-            "Recursive relation of '%s' container" % (self.get_ns(),)
-        )
+        if self in (parents or self._parents):
+            raise error(
+                "Recursive relation of '%s' container" % (self.get_ns(),)
+            )
 
     def insert_item(self, s, index=None):
         self._insert_item(s, index)
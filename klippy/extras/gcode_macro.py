@@ -8,6 +8,7 @@ import copy
 import json
 import logging
 import math
+import queue
 import threading
 import traceback
 import typing
@@ -23,6 +24,8 @@ from klippy import configfile
 
 # Wrapper for access to printer object get_status() methods
 class GetStatusWrapperJinja:
+    __slots__ = ("printer", "eventtime", "cache")
+
     def __init__(self, printer, eventtime=None):
         self.printer = printer
         self.eventtime = eventtime
@@ -49,36 +52,52 @@ class GetStatusWrapperJinja:
 
     def __iter__(self):
         for name, obj in self.printer.lookup_objects():
-            if self.__contains__(name):
+            if hasattr(obj, "get_status"):
                 yield name
 
 
 class GetStatusWrapperPython:
+    __slots__ = ("printer", "monotonic", "objects", "names")
+
     def __init__(self, printer):
         self.printer = printer
+        self.monotonic = printer.get_reactor().monotonic
+        # Status values must stay live (macros poll them in wait_until()),
+        # but the objects providing them never change once loaded
+        self.objects = {}
+        self.names = None
 
-    def __getitem__(self, val):
+    def _lookup(self, val):
         sval = str(val).strip()
-        po = self.printer.lookup_object(sval, None)
-        if po is None or not hasattr(po, "get_status"):
-            raise KeyError(val)
-        eventtime = self.printer.get_reactor().monotonic()
-        return po.get_status(eventtime)
+        po = self.objects.get(sval)
+        if po is None:
+            po = self.printer.lookup_object(sval, None)
+            if po is None or not hasattr(po, "get_status"):
+                raise KeyError(val)
+            self.objects[sval] = po
+        return po
+
+    def __getitem__(self, val):
+        return self._lookup(val).get_status(self.monotonic())
 
     def __getattr__(self, val):
         return self.__getitem__(val)
 
     def __contains__(self, val):
         try:
-            self.__getitem__(val)
+            self._lookup(val)
         except KeyError as e:
             return False
         return True
 
     def __iter__(self):
-        for name, obj in self.printer.lookup_objects():
-            if self.__contains__(name):
-                yield name
+        if self.names is None:
+            self.names = [
+                name
+                for name, obj in self.printer.lookup_objects()
+                if hasattr(obj, "get_status")
+            ]
+        return iter(self.names)
 
     def get(self, key: str, default: configfile.sentinel):
         try:
@@ -98,7 +117,8 @@ class TemplateWrapperJinja:
         gcode_macro = self.printer.lookup_object("gcode_macro")
         self.create_template_context = gcode_macro.create_template_context
         try:
-            self.template = env.from_string(script)
+            tree = env.parse(script)
+            self.template = env.from_string(tree)
         except jinja2.exceptions.TemplateSyntaxError as e:
             lines = script.splitlines()
             msg = "Error loading template '%s'\nline %s: %s # %s" % (
@@ -117,8 +137,20 @@ class TemplateWrapperJinja:
             )
             logging.exception(msg)
             raise printer.config_error(msg)
+        # Templates without any expressions or statements render to a
+        # constant, so no context needs to be created for them
+        nodes = jinja2.nodes
+        self.constant = None
+        if all(
+            isinstance(node, nodes.Output)
+            and all(isinstance(n, nodes.TemplateData) for n in node.nodes)
+            for node in tree.body
+        ):
+            self.constant = str(self.template.render())
 
     def render(self, context=None):
+        if self.constant is not None:
+            return self.constant
         if context is None:
             context = self.create_template_context()
         try:
@@ -136,15 +168,51 @@ class TemplateWrapperJinja:
 
 
 class TemplateWrapperPython:
+    __slots__ = (
+        "printer",
+        "name",
+        "toolhead",
+        "gcode",
+        "gcode_macro",
+        "helpers",
+        "vars",
+        "func",
+    )
+
     def __init__(self, printer, env, name, script):
         self.printer = printer
         self.name = name
         self.toolhead = None
         self.gcode = self.printer.lookup_object("gcode")
         self.gcode_macro = self.printer.lookup_object("gcode_macro")
-        self.create_template_context = self.gcode_macro.create_template_context
-        self.checked_own_macro = False
+        gcode_macro = self.gcode_macro
+        self.helpers = {
+            "printer": GetStatusWrapperPython(self.printer),
+            "emit": self._action_emit,
+            "wait_while": self._action_wait_while,
+            "wait_until": self._action_wait_until,
+            "wait_moves": self._action_wait_moves,
+            "blocking": gcode_macro._action_blocking,
+            "sleep": self._action_sleep,
+            "set_gcode_variable": self._action_set_gcode_variable,
+            "emergency_stop": gcode_macro._action_emergency_stop,
+            "respond_info": gcode_macro._action_respond_info,
+            "raise_error": gcode_macro._action_raise_error,
+            "call_remote_method": gcode_macro._action_call_remote_method,
+            "action_emergency_stop": gcode_macro._action_emergency_stop,
+            "action_respond_info": gcode_macro._action_respond_info,
+            "action_raise_error": gcode_macro._action_raise_error,
+            "action_call_remote_method": gcode_macro._action_call_remote_method,
+            "action_log": gcode_macro._action_log,
+            "math": math,
+        }
         self.vars = None
+        # The owning gcode_macro is only registered after its config
+        # section finishes loading, so fall back to resolving on connect
+        if not self._lookup_own_vars():
+            self.printer.register_event_handler(
+                "klippy:connect", self._lookup_own_vars
+            )
 
         try:
             self.func = compile(script, name, "exec")
@@ -158,40 +226,15 @@ class TemplateWrapperPython:
             logging.exception(msg)
             raise self.gcode.error(msg)
 
-    def run_gcode_from_command(self, context=None):
-        helpers = {
-            "printer": GetStatusWrapperPython(self.printer),
-            "emit": self._action_emit,
-            "wait_while": self._action_wait_while,
-            "wait_until": self._action_wait_until,
-            "wait_moves": self._action_wait_moves,
-            "blocking": self._action_blocking,
-            "sleep": self._action_sleep,
-            "set_gcode_variable": self._action_set_gcode_variable,
-            "emergency_stop": self.gcode_macro._action_emergency_stop,
-            "respond_info": self.gcode_macro._action_respond_info,
-            "raise_error": self.gcode_macro._action_raise_error,
-            "call_remote_method": self.gcode_macro._action_call_remote_method,
-            "action_emergency_stop": self.gcode_macro._action_emergency_stop,
-            "action_respond_info": self.gcode_macro._action_respond_info,
-            "action_raise_error": self.gcode_macro._action_raise_error,
-            "action_call_remote_method": self.gcode_macro._action_call_remote_method,
-            "math": math,
-        }
-
-        if not self.checked_own_macro:
-            self.checked_own_macro = True
-            own_macro = self.printer.lookup_object(
-                self.name.split(":")[0], None
-            )
-            if own_macro is not None and isinstance(own_macro, GCodeMacro):
-                self.vars = TemplateVariableWrapperPython(own_macro)
-        if self.vars is not None:
-            helpers["own_vars"] = self.vars
+    def create_template_context(self, eventtime=None):
+        # The jinja context is entirely replaced by self.helpers
+        return {}
 
+    def run_gcode_from_command(self, context=None):
         if context is None:
-            context = {}
-        exec_globals = dict(context | helpers)
+            exec_globals = dict(self.helpers)
+        else:
+            exec_globals = {**context, **self.helpers}
         try:
             exec(self.func, exec_globals, {})
         except Exception as e:
@@ -202,52 +245,30 @@ class TemplateWrapperPython:
             logging.exception(msg)
             raise self.gcode.error(msg)
 
+    def _lookup_own_vars(self):
+        own_macro = self.printer.lookup_object(self.name.split(":")[0], None)
+        if own_macro is not None and isinstance(own_macro, GCodeMacro):
+            self.vars = TemplateVariableWrapperPython(own_macro)
+            self.helpers["own_vars"] = self.vars
+        return self.vars is not None
+
     def _action_emit(self, gcode):
         self.gcode.run_script_from_command(gcode)
 
     def _action_wait_while(self, check):
-        def inner(eventtime):
-            return check()
-
-        self.printer.wait_while(check)
+        self.printer.wait_while(lambda eventtime: check())
 
     def _action_wait_until(self, check):
-        def inner(eventtime):
-            return not check()
-
-        self.printer.wait_while(inner)
+        self.printer.wait_while(lambda eventtime: not check())
 
     def _action_wait_moves(self):
         if self.toolhead is None:
             self.toolhead = self.printer.lookup_object("toolhead")
         self.toolhead.wait_moves()
 
-    def _action_blocking(self, func):
-        completion = self.printer.get_reactor().completion()
-
-        def run():
-            try:
-                ret = func()
-                completion.complete((False, ret))
-            except Exception as e:
-                completion.complete((True, e))
-
-        t = threading.Thread(target=run, daemon=True)
-        t.start()
-        [is_exception, ret] = completion.wait()
-        if is_exception:
-            raise ret
-        else:
-            return ret
-
     def _action_sleep(self, timeout):
-        reactor = self.printer.get_reactor()
-        deadline = reactor.monotonic() + timeout
-
-        def check(event):
-            return deadline > reactor.monotonic()
-
-        self.printer.wait_while(check)
+        deadline = self.printer.get_reactor().monotonic() + timeout
+        self.printer.wait_while(lambda eventtime: deadline > eventtime)
 
     def _action_set_gcode_variable(self, macro, variable, value):
         macro = self.printer.lookup_object(f"gcode_macro {macro}")
@@ -257,29 +278,32 @@ class TemplateWrapperPython:
 
 
 class TemplateVariableWrapperPython:
+    __slots__ = ("__macro",)
+
     def __init__(self, macro):
-        self.__dict__["__macro"] = macro
+        # __setattr__ is reserved for macro variables
+        object.__setattr__(self, "_TemplateVariableWrapperPython__macro", macro)
 
     def __setattr__(self, name, value):
-        v = dict(self.__dict__["__macro"].variables)
-        v[name] = value
-        self.__dict__["__macro"].variables = v
+        self.update({name: value})
+
+    def update(self, *args, **kwargs):
+        # Status subscribers detect changes by object identity, so copy
+        # the variables - but only once for a batch of assignments
+        v = dict(self.__macro.variables)
+        v.update(*args, **kwargs)
+        self.__macro.variables = v
 
     def __getattr__(self, name):
-        if name not in self.__dict__["__macro"].variables:
+        if name not in self.__macro.variables:
             raise KeyError(name)
-        return self.__dict__["__macro"].variables[name]
+        return self.__macro.variables[name]
 
     def __contains__(self, val):
-        try:
-            self.__getattr__(val)
-        except KeyError as e:
-            return False
-        return True
+        return val in self.__macro.variables
 
     def __iter__(self):
-        for name, obj in self.__dict__["__macro"].variables:
-            yield name
+        return iter(self.__macro.variables)
 
 
 class Template:
@@ -329,6 +353,37 @@ class PrinterGCodeMacro:
         self.gcode.register_command(
             "RELOAD_GCODE_MACROS", self.cmd_RELOAD_GCODE_MACROS
         )
+        # Worker threads for blocking() calls from python macros
+        self.blocking_queue = queue.Queue()
+        self.blocking_lock = threading.Lock()
+        self.blocking_threads = self.blocking_idle = 0
+        self.printer.register_event_handler(
+            "klippy:disconnect", self._handle_disconnect
+        )
+
+    def _handle_disconnect(self):
+        with self.blocking_lock:
+            for i in range(self.blocking_threads):
+                self.blocking_queue.put(None)
+            # Old workers drain their own queue; start afresh on next call
+            self.blocking_queue = queue.Queue()
+            self.blocking_threads = self.blocking_idle = 0
+
+    def _blocking_worker(self, jobs):
+        reactor = self.printer.get_reactor()
+        while True:
+            job = jobs.get()
+            if job is None:
+                return
+            func, completion = job
+            try:
+                result = (False, func())
+            except Exception as e:
+                result = (True, e)
+            with self.blocking_lock:
+                if jobs is self.blocking_queue:
+                    self.blocking_idle += 1
+            reactor.async_complete(completion, result)
 
     def load_template(self, config, option, default=None):
         name = "%s:%s" % (config.get_name(), option)
@@ -345,7 +400,7 @@ class PrinterGCodeMacro:
         return ""
 
     def _action_respond_info(self, msg):
-        self.printer.lookup_object("gcode").respond_info(msg)
+        self.gcode.respond_info(msg)
         return ""
 
     def _action_log(self, msg):
@@ -355,6 +410,25 @@ class PrinterGCodeMacro:
     def _action_raise_error(self, msg):
         raise self.printer.command_error(msg)
 
+    def _action_blocking(self, func):
+        completion = self.printer.get_reactor().completion()
+        with self.blocking_lock:
+            if self.blocking_idle:
+                self.blocking_idle -= 1
+            else:
+                self.blocking_threads += 1
+                t = threading.Thread(
+                    target=self._blocking_worker,
+                    args=(self.blocking_queue,),
+                    daemon=True,
+                )
+                t.start()
+            self.blocking_queue.put((func, completion))
+        is_exception, ret = completion.wait()
+        if is_exception:
+            raise ret
+        return ret
+
     def _action_call_remote_method(self, method, **kwargs):
         webhooks = self.printer.lookup_object("webhooks")
         try:
@@ -9,15 +9,16 @@ from klippy.printer import Printer, SubsystemComponentCollection
 from . import ads131m0x, ads1220, hx71x
 from .load_cell import LoadCell
 
+# sensors that implement BulkAdcSensor
+SENSOR_TYPES = (
+    hx71x.HX71X_SENSOR_TYPES
+    | ads1220.ADS1220_SENSOR_TYPE
+    | ads131m0x.ADS131M0X_SENSOR_TYPES
+)
+
 
-# register sensors that implement BulkAdcSensor
 def register_components(subsystem: SubsystemComponentCollection):
-    sensors = (
-        hx71x.HX71X_SENSOR_TYPES
-        | ads1220.ADS1220_SENSOR_TYPE
-        | ads131m0x.ADS131M0X_SENSOR_TYPES
-    )
-    for name, sensor in sensors.items():
+    for name, sensor in SENSOR_TYPES.items():
         subsystem.register_component("load_cell_sensors", name, sensor)
 
 
@@ -8,6 +8,7 @@ import ast
 import configparser
 import logging
 import os
+import shutil
 
 
 class SaveVariables:
@@ -51,22 +52,35 @@ class SaveVariables:
             value = ast.literal_eval(value)
         except ValueError as e:
             raise gcmd.error("Unable to parse '%s' as a literal" % (value,))
+        # Option names are case-insensitive in the variable file
+        varname = varname.lower()
         newvars = dict(self.allVariables)
         newvars[varname] = value
-        # Write file
-        varfile = configparser.ConfigParser()
-        varfile.add_section("Variables")
+        # Write file (escape '%' for configparser interpolation on load)
+        lines = ["[Variables]\n"]
         for name, val in sorted(newvars.items()):
-            varfile.set("Variables", name, repr(val))
+            lines.append("%s = %s\n" % (name, repr(val).replace("%", "%%")))
+        # Replace the real file (not a symlink to it) and keep its mode
+        filename = os.path.realpath(self.filename)
+        tmpname = filename + ".tmp"
         try:
-            f = open(self.filename, "w")
-            varfile.write(f)
-            f.close()
+            with open(tmpname, "w") as f:
+                f.write("".join(lines))
+                f.flush()
+                os.fsync(f.fileno())
+            if os.path.exists(filename):
+                shutil.copymode(filename, tmpname)
+            os.replace(tmpname, filename)
         except:
             msg = "Unable to save variable"
             logging.exception(msg)
+            try:
+                os.remove(tmpname)
+            except OSError:
+                pass
             raise gcmd.error(msg)
-        self.loadVariables()
+        # Replace (rather than update) so status consumers see the change
+        self.allVariables = newvars
 
     def get_status(self, eventtime):
         return {"variables": self.allVariables}
@@ -4,6 +4,7 @@
 # Copyright (C) 2016-2024  Kevin O'Connor <kevin@koconnor.net>
 #
 # This file may be distributed under the terms of the GNU GPLv3 license.
+import concurrent.futures
 import json
 import logging
 import optparse
@@ -94,6 +95,7 @@ STATIC_STRING_MIN = 2
 class HandleEnumerations:
     def __init__(self):
         self.static_strings = []
+        self.static_strings_set = set()
         self.enumerations = {}
         self.ctr_dispatch = {
             "_DECL_STATIC_STR": self.decl_static_str,
@@ -119,7 +121,8 @@ class HandleEnumerations:
 
     def decl_static_str(self, req):
         msg = req.split(None, 1)[1]
-        if msg not in self.static_strings:
+        if msg not in self.static_strings_set:
+            self.static_strings_set.add(msg)
             self.static_strings.append(msg)
 
     def update_data_dictionary(self, data):
@@ -225,9 +228,10 @@ class HandleInitialPins:
             if p.startswith("!"):
                 flag = "0"
                 p = p[1:].strip()
-            if p not in pinmap:
+            pin = pinmap.get(p)
+            if pin is None:
                 error("Unknown initial pin '%s'" % (p,))
-            out.append("\n    {%d, %s}, // %s" % (pinmap[p], flag, p))
+            out.append("\n    {%d, %s}, // %s" % (pin, flag, p))
         return out
 
     def generate_code(self, options):
@@ -304,6 +308,7 @@ class HandleCommandGeneration:
     def __init__(self):
         self.commands = {}
         self.encoders = []
+        self.encoder_msgs = set()
         self.msg_to_encid = dict(msgproto.DefaultMessages)
         self.encid_to_msgid = {}
         self.messages_by_name = {m.split()[0]: m for m in self.msg_to_encid}
@@ -332,11 +337,17 @@ class HandleCommandGeneration:
         if m is not None and m != msg:
             error("Conflicting definition for message '%s'" % msgname)
         self.messages_by_name[msgname] = msg
-        self.encoders.append((msgname, msg))
+        self.add_encoder(msgname, msg)
 
     def decl_output(self, req):
         msg = req.split(None, 1)[1]
-        self.encoders.append((None, msg))
+        self.add_encoder(None, msg)
+
+    def add_encoder(self, msgname, msg):
+        # Only the first declaration of a given message is generated
+        if msg not in self.encoder_msgs:
+            self.encoder_msgs.add(msg)
+            self.encoders.append((msgname, msg))
 
     def convert_encoded_msgid(self, encoded_msgid):
         if encoded_msgid >= 0x80:
@@ -363,36 +374,27 @@ class HandleCommandGeneration:
         }
 
     def update_data_dictionary(self, data):
+        command_msgs = set()
+        response_msgs = set()
+        for msgname, msg in self.messages_by_name.items():
+            if msgname in self.commands:
+                command_msgs.add(msg)
+            else:
+                response_msgs.add(msg)
         # Convert ids to standard form (use both positive and negative numbers)
-        msg_to_msgid = {
-            msg: self.encid_to_msgid[encoded_msgid]
-            for msg, encoded_msgid in self.msg_to_encid.items()
-        }
-        command_ids = [
-            msg_to_msgid[msg]
-            for msgname, msg in self.messages_by_name.items()
-            if msgname in self.commands
-        ]
-        response_ids = [
-            msg_to_msgid[msg]
-            for msgname, msg in self.messages_by_name.items()
-            if msgname not in self.commands
-        ]
-        data["commands"] = {
-            msg: msgid
-            for msg, msgid in msg_to_msgid.items()
-            if msgid in command_ids
-        }
-        data["responses"] = {
-            msg: msgid
-            for msg, msgid in msg_to_msgid.items()
-            if msgid in response_ids
-        }
-        output = {
-            msg: msgid
-            for msg, msgid in msg_to_msgid.items()
-            if msgid not in command_ids and msgid not in response_ids
-        }
+        commands = {}
+        responses = {}
+        output = {}
+        for msg, encoded_msgid in self.msg_to_encid.items():
+            msgid = self.encid_to_msgid[encoded_msgid]
+            if msg in command_msgs:
+                commands[msg] = msgid
+            elif msg in response_msgs:
+                responses[msg] = msgid
+            else:
+                output[msg] = msgid
+        data["commands"] = commands
+        data["responses"] = responses
         if output:
             data["output"] = output
 
@@ -449,12 +451,8 @@ class HandleCommandGeneration:
         encoder_defs = []
         output_code = []
         encoder_code = []
-        did_output = {}
         for msgname, msg in self.encoders:
             encoded_msgid = self.msg_to_encid[msg]
-            if encoded_msgid in did_output:
-                continue
-            did_output[encoded_msgid] = True
             code = (
                 '    if (__builtin_strcmp(str, "%s") == 0)\n'
                 "        return &command_encoder_%s;\n" % (msg, encoded_msgid)
@@ -531,11 +529,9 @@ const uint16_t command_index_size PROGMEM = ARRAY_SIZE(command_index);
         return fmt % (externs, index)
 
     def generate_param_code(self):
-        sorted_param_types = sorted(
-            [(i, a) for a, i in self.all_param_types.items()]
-        )
+        # Ids are assigned in insertion order, so the dict is already sorted
         params = [""]
-        for paramid, argtypes in sorted_param_types:
+        for argtypes, paramid in self.all_param_types.items():
             params.append(
                 "static const uint8_t command_parameters%d[] PROGMEM = {\n"
                 "    %s };"
@@ -567,20 +563,21 @@ Handlers.append(HandleCommandGeneration())
 def check_output(prog):
     logging.debug("Running %s" % (repr(prog),))
     try:
-        process = subprocess.Popen(shlex.split(prog), stdout=subprocess.PIPE)
-        output = process.communicate()[0]
-        retcode = process.poll()
+        process = subprocess.run(
+            shlex.split(prog), stdout=subprocess.PIPE, encoding="utf8"
+        )
     except OSError:
         logging.debug("Exception on run: %s" % (traceback.format_exc(),))
         return ""
-    logging.debug("Got (code=%s): %s" % (retcode, repr(output)))
-    if retcode:
-        return ""
-    try:
-        return str(output.decode("utf8"))
     except UnicodeError:
         logging.debug("Exception on decode: %s" % (traceback.format_exc(),))
         return ""
+    logging.debug(
+        "Got (code=%s): %s" % (process.returncode, repr(process.stdout))
+    )
+    if process.returncode:
+        return ""
+    return process.stdout
 
 
 # Obtain version info from "git" program
@@ -612,9 +609,16 @@ def tool_versions(tools):
     tools = [t.strip() for t in tools.split(";")]
     versions = ["", ""]
     success = 0
-    for tool in tools:
+    # Run the programs in parallel - they are independent of each other
+    with concurrent.futures.ThreadPoolExecutor(len(tools)) as executor:
+        outputs = list(
+            executor.map(
+                lambda tool: check_output("%s --version" % (tool,)), tools
+            )
+        )
+    for output in outputs:
         # Extract first line from "tool --version" output
-        verstr = check_output("%s --version" % (tool,)).split("\n")[0]
+        verstr = output.split("\n")[0]
         # Check if this tool looks like a binutils program
         isbinutils = 0
         if verstr.startswith("GNU "):
@@ -692,12 +696,11 @@ class HandleIdentify:
             f.close()
 
         # Format compressed info into C code
-        zdatadict = bytearray(zlib.compress(datadict.encode(), 9))
+        zdatadict = zlib.compress(datadict.encode(), 9)
         out = []
-        for i in range(len(zdatadict)):
-            if i % 8 == 0:
-                out.append("\n   ")
-            out.append(" 0x%02x," % (zdatadict[i],))
+        for i in range(0, len(zdatadict), 8):
+            row = zdatadict[i : i + 8].hex(" ").replace(" ", ", 0x")
+            out.append("\n    0x%s," % (row,))
         fmt = """
 const uint8_t command_identify_data[] PROGMEM = {%s
 };
@@ -759,10 +762,11 @@ def main():
         req = req.lstrip()
         if not req:
             continue
-        cmd = req.split()[0]
-        if cmd not in ctr_dispatch:
+        cmd = req.split(None, 1)[0]
+        func = ctr_dispatch.get(cmd)
+        if func is None:
             error("Unknown build time command '%s'" % cmd)
-        ctr_dispatch[cmd](req)
+        func(req)
 
     # Write output
     code = "".join([FILEHEADER] + [h.generate_code(options) for h in Handlers])